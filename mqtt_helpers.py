@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for the MQTT simulator and test scripts
+One tuned client setup (callback API v2, TCP_NODELAY, TLS/WebSocket options),
+a Publisher with the shared serializer and batched acknowledgments, and a
+drift-free Ticker for publish loops.
+"""
+
+import paho.mqtt.client as mqtt
+import argparse
+import logging
+import logging.handlers
+import queue
+import socket
+import ssl
+import sys
+import time
+
+# orjson is much faster than stdlib json and emits bytes directly
+try:
+    import orjson
+
+    def dumps(obj):
+        return orjson.dumps(obj)
+except ImportError:
+    import json
+
+    def dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+def setup_logging(logger, verbose=False):
+    """Route a logger through a queue so console I/O runs off the publish thread.
+
+    Returns the started QueueListener; call stop() on it to flush pending lines.
+    """
+    log_queue = queue.Queue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+    logger.propagate = False
+    listener.start()
+    return listener
+
+def enable_tcp_nodelay(client, userdata, sock):
+    """on_socket_open callback: disable Nagle so small MQTT frames flush immediately"""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+def build_client(client_id, tls=False, ws=False, ws_path="/mqtt", username=None, password=None):
+    """Create a paho client (callback API v2) with the shared transport settings.
+
+    Plain TCP and TLS connections get TCP_NODELAY; WebSocket connections use
+    paho's socket wrapper, which does not expose setsockopt.
+    """
+    client = mqtt.Client(
+        client_id=client_id,
+        transport="websockets" if ws else "tcp",
+        callback_api_version=mqtt.CallbackAPIVersion.VERSION2
+    )
+    if ws:
+        client.ws_set_options(path=ws_path)
+    else:
+        client.on_socket_open = enable_tcp_nodelay
+    if username is not None:
+        client.username_pw_set(username, password)
+    if tls:
+        client.tls_set(cert_reqs=ssl.CERT_REQUIRED, tls_version=ssl.PROTOCOL_TLSv1_2)
+    return client
+
+class Publisher:
+    """Publishes to one topic with the shared serializer and batched acknowledgments.
+
+    bytes/str payloads are sent as-is, anything else is serialized with dumps().
+    For QoS 1/2 the broker acknowledgment is awaited once per `batch` messages
+    and reported through on_batch(count, acknowledged). With batch=None nothing
+    is tracked or awaited; callers follow acks through on_publish themselves.
+    """
+
+    def __init__(self, client, topic, qos=0, batch=None, timeout=10, on_batch=None):
+        self.client = client
+        self.topic = topic  # str: paho encodes/validates topics and rejects bytes
+        self.qos = qos
+        self.batch = batch
+        self.timeout = timeout
+        self.on_batch = on_batch
+        self.pending = []
+
+    def publish(self, payload):
+        """Queue one message; returns paho's MQTTMessageInfo"""
+        if not isinstance(payload, (bytes, str)):
+            payload = dumps(payload)
+        result = self.client.publish(self.topic, payload, qos=self.qos)
+        if self.batch is not None and self.qos > 0 and result.rc == mqtt.MQTT_ERR_SUCCESS:
+            self.pending.append(result)
+            if len(self.pending) >= self.batch:
+                self.flush()
+        return result
+
+    def flush(self):
+        """Wait once for the last outstanding message instead of once per message"""
+        if not self.pending:
+            return
+        last = self.pending[-1]
+        last.wait_for_publish(timeout=self.timeout)
+        if self.on_batch is not None:
+            self.on_batch(len(self.pending), last.is_published())
+        self.pending.clear()
+
+class Ticker:
+    """Drift-free schedule on the monotonic clock"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_tick = time.monotonic()
+
+    def delay(self):
+        """Seconds to sleep until the next tick (0 and resync if we fell behind)"""
+        self.next_tick += self.interval
+        remaining = self.next_tick - time.monotonic()
+        if remaining > 0:
+            return remaining
+        self.next_tick = time.monotonic()
+        return 0
+
+def positive_int(value):
+    """argparse type for options that must be >= 1"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {value}")
+    return number
+
+def positive_float(value):
+    """argparse type for options that must be > 0"""
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive number, got {value}")
+    return number
@@ -6,91 +6,152 @@ Format: {"ts":175938,"mode":"AUTO","bme":{...},"ds18b20":[...],"soil":[...],"wat
 """
 
 import paho.mqtt.client as mqtt
-import json
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
 import time
 import random
-from datetime import datetime
+
+from mqtt_helpers import Publisher, Ticker, build_client, positive_int, setup_logging
 
 # MQTT Configuration - Using test.mosquitto.org public broker
 MQTT_BROKER = "test.mosquitto.org"
 MQTT_PORT = 1883  # Standard MQTT TCP port (backend uses this, web uses 8083 WSS)
-MQTT_TOPIC = "d02/telemetry"
+MQTT_TOPIC = "d02/telemetry"  # str on purpose: paho encodes/validates topics and rejects bytes
 MQTT_QOS = 0
 
 # Simulation settings
 PUBLISH_INTERVAL = 5  # seconds
 MODE = "AUTO"  # AUTO, MANUAL, SCHEDULE
+LOG_EVERY = 10  # without --verbose, log a progress line every N messages
+
+logger = logging.getLogger(__name__)
+
+# Sensor value ranges (inclusive)
+# Uniform floats: [bme temp, bme humidity, water 1, water 2]
+UNIFORM_RANGES = [(24.0, 28.0), (50.0, 70.0), (0.1, 2.0), (0.1, 2.0)]
+# Integers: [bme pressure, soil 1, soil 2, soil 3]
+INTEGER_RANGES = [(995, 1005), (95, 100), (95, 100), (95, 100)]
+# Pump ON probabilities: [irrigation 10%, suction 5%]
+PUMP_PROBABILITY = [0.1, 0.05]
+
+# numpy draws all values in one vectorized call per message; fall back to
+# the random module when it is not installed
+try:
+    import numpy as np
+
+    rng = np.random.default_rng()
+    _uniform_low, _uniform_high = np.array(UNIFORM_RANGES).T
+    _integer_low, _integer_high = np.array(INTEGER_RANGES).T
+    _pump_probability = np.array(PUMP_PROBABILITY)
+
+    def draw_sensor_values():
+        """Return (uniform floats, integers, pump flags) as plain Python lists"""
+        return (
+            rng.uniform(_uniform_low, _uniform_high).tolist(),
+            rng.integers(_integer_low, _integer_high, endpoint=True).tolist(),
+            (rng.random(2) < _pump_probability).astype(int).tolist()
+        )
+
+    def reseed():
+        """Give a forked worker its own random stream"""
+        global rng
+        rng = np.random.default_rng()
+except ImportError:
+    def draw_sensor_values():
+        """Return (uniform floats, integers, pump flags) as plain Python lists"""
+        return (
+            [random.uniform(low, high) for low, high in UNIFORM_RANGES],
+            [random.randint(low, high) for low, high in INTEGER_RANGES],
+            [int(random.random() < p) for p in PUMP_PROBABILITY]
+        )
+
+    def reseed():
+        """Give a forked worker its own random stream"""
+        random.seed()
+
+# Payload template, allocated once and patched in place on every message.
+# DS18B20: 3 soil temperature sensors (-127 means error/disconnected)
+# Valve: 3 valves (0=OFF, 1=ON)
+# Pump: 2 pumps - irrigation, suction (0=OFF, 1=ON)
+_payload = {
+    "ts": 0,
+    "mode": MODE,
+    "bme": {"t": 0.0, "p": 0, "h": 0.0},
+    "ds18b20": [-127.00, 0.00, 0.00],
+    "soil": [0, 0, 0],
+    "water": [0.0, 0.0],
+    "valve": [0, 0, 0],
+    "pump": [0, 0]
+}
 
 def generate_telemetry_data():
-    """Generate realistic sensor data in STM32 format"""
+    """Generate realistic sensor data in STM32 format.
+
+    Returns the shared module-level payload dict, updated in place.
+    """
     
     # Timestamp (milliseconds since boot)
-    timestamp = int(time.time() * 1000) % 10000000
+    _payload["ts"] = int(time.time() * 1000) % 10000000
     
-    # BME280 sensor (temperature, pressure, humidity)
-    bme_temp = round(random.uniform(24.0, 28.0), 2)
-    bme_pressure = random.randint(995, 1005)
-    bme_humidity = round(random.uniform(50.0, 70.0), 1)
+    uniform, integers, pump = draw_sensor_values()
     
-    # DS18B20 soil temperature sensors (3 sensors, -127 means error/disconnected)
-    ds18b20 = [
-        -127.00,  # Sensor 1 - disconnected
-        0.00,     # Sensor 2 - not initialized
-        0.00      # Sensor 3 - not initialized
-    ]
+    # BME280 sensor (temperature, pressure, humidity)
+    bme = _payload["bme"]
+    bme["t"] = round(uniform[0], 2)
+    bme["p"] = integers[0]
+    bme["h"] = round(uniform[1], 1)
     
     # Soil moisture sensors (3 sensors, 0-100%)
-    soil = [
-        random.randint(95, 100),
-        random.randint(95, 100),
-        random.randint(95, 100)
-    ]
+    _payload["soil"][:] = integers[1:]
     
     # Water level sensors (2 sensors, 0-100%)
-    water = [
-        round(random.uniform(0.1, 2.0), 1),
-        round(random.uniform(0.1, 2.0), 1)
-    ]
-    
-    # Valve states (3 valves, 0=OFF, 1=ON)
-    valve = [0, 0, 0]
+    water = _payload["water"]
+    water[0] = round(uniform[2], 1)
+    water[1] = round(uniform[3], 1)
     
-    # Pump states (2 pumps: irrigation, suction - 0=OFF, 1=ON)
-    pump = [0, 0]  # Both OFF by default
+    # Pump states, randomly ON
+    _payload["pump"][:] = pump
     
-    # Randomly turn on pumps (10% chance)
-    if random.random() < 0.1:
-        pump[0] = 1  # Irrigation ON
-    if random.random() < 0.05:
-        pump[1] = 1  # Suction ON
-    
-    # Build JSON payload
-    payload = {
-        "ts": timestamp,
-        "mode": MODE,
-        "bme": {
-            "t": bme_temp,
-            "p": bme_pressure,
-            "h": bme_humidity
-        },
-        "ds18b20": ds18b20,
-        "soil": soil,
-        "water": water,
-        "valve": valve,
-        "pump": pump
-    }
-    
-    return payload
+    return _payload
+
+# Wire format for the fixed telemetry schema. Keys and array lengths never
+# change, so %-formatting is faster than any JSON serializer. The constant
+# ds18b20/valve values must stay in sync with the _payload template.
+TELEMETRY_FORMAT = (
+    b'{"ts":%d,"mode":"' + MODE.encode() + b'",'
+    b'"bme":{"t":%.2f,"p":%d,"h":%.1f},'
+    b'"ds18b20":[-127.00,0.00,0.00],'
+    b'"soil":[%d,%d,%d],'
+    b'"water":[%.1f,%.1f],'
+    b'"valve":[0,0,0],'
+    b'"pump":[%d,%d]}'
+)
+
+def encode_telemetry(payload):
+    """Serialize a telemetry payload to compact JSON bytes"""
+    bme = payload["bme"]
+    soil = payload["soil"]
+    water = payload["water"]
+    pump = payload["pump"]
+    return TELEMETRY_FORMAT % (
+        payload["ts"], bme["t"], bme["p"], bme["h"],
+        soil[0], soil[1], soil[2],
+        water[0], water[1],
+        pump[0], pump[1]
+    )
 
 def on_connect(client, userdata, flags, rc, properties):
     """Callback when connected to MQTT broker (API VERSION2)"""
     if rc == 0:
-        print(f"✅ Connected to MQTT broker: {MQTT_BROKER}")
-        print(f"📡 Publishing to topic: {MQTT_TOPIC}")
-        print(f"⏱️  Interval: {PUBLISH_INTERVAL} seconds")
-        print("-" * 60)
+        logger.info("✅ Connected to MQTT broker: %s", MQTT_BROKER)
+        logger.info("📡 Publishing to topic: %s", MQTT_TOPIC)
+        logger.info("⏱️  Interval: %s seconds", PUBLISH_INTERVAL)
+        logger.info("-" * 60)
     else:
-        print(f"❌ Failed to connect, return code: {rc}")
+        logger.error("❌ Failed to connect, return code: %s", rc)
 
 def on_publish(client, userdata, mid, rc, properties):
     """Callback when message is published (API VERSION2)"""
@@ -99,33 +160,37 @@ def on_publish(client, userdata, mid, rc, properties):
 def on_disconnect(client, userdata, flags, rc, properties):
     """Callback when disconnected from MQTT broker (API VERSION2)"""
     if rc != 0:
-        print(f"⚠️  Unexpected disconnection. Reconnecting...")
+        logger.warning("⚠️  Unexpected disconnection. Reconnecting...")
 
-def main():
-    """Main function to simulate STM32 MQTT publishing"""
-    
-    print("=" * 60)
-    print("🌱 STM32 MQTT Simulator")
-    print("=" * 60)
-    print(f"Broker: {MQTT_BROKER}:{MQTT_PORT}")
-    print(f"Topic: {MQTT_TOPIC}")
-    print(f"QoS: {MQTT_QOS}")
-    print(f"Mode: {MODE}")
-    print("=" * 60)
-    print()
-    
+def parse_args():
+    parser = argparse.ArgumentParser(description="STM32 MQTT telemetry simulator")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="log every published message in full")
+    parser.add_argument("--aggregate", type=positive_int, default=1, metavar="K",
+                        help="publish K samples per message as a JSON array; the dashboard "
+                             "expects single objects, so use K > 1 for load tests (default: 1)")
+    parser.add_argument("--workers", type=positive_int, default=1,
+                        help="publisher processes, each with its own MQTT client (default: 1)")
+    return parser.parse_args()
+
+def publish_telemetry(client_id, args, stop_event=None):
+    """Connect one MQTT client and publish until interrupted; return messages sent.
+
+    Without stop_event the loop runs until KeyboardInterrupt; worker
+    processes ignore SIGINT and poll stop_event instead.
+    """
     # Create MQTT client (standard TCP)
-    client = mqtt.Client(
-        client_id=f"STM32_Simulator_{random.randint(1000, 9999)}",
-        callback_api_version=mqtt.CallbackAPIVersion.VERSION2
-    )
+    client = build_client(client_id)
     client.on_connect = on_connect
     client.on_publish = on_publish
     client.on_disconnect = on_disconnect
+    publisher = Publisher(client, MQTT_TOPIC, qos=MQTT_QOS)
     
+    message_count = 0
+    samples = []  # encoded samples waiting to be published together
     try:
         # Connect to broker
-        print(f"🔌 Connecting to {MQTT_BROKER}:{MQTT_PORT}...")
+        logger.info("🔌 [%s] Connecting to %s:%s...", client_id, MQTT_BROKER, MQTT_PORT)
         client.connect(MQTT_BROKER, MQTT_PORT, 60)
         
         # Start network loop
@@ -134,47 +199,143 @@ def main():
         # Wait for connection
         time.sleep(2)
         
-        # Publish loop
-        message_count = 0
-        while True:
+        # Publish loop, scheduled against the monotonic clock so the time
+        # spent generating/publishing does not add drift to the interval
+        ticker = Ticker(PUBLISH_INTERVAL)
+        while stop_event is None or not stop_event.is_set():
             # Generate telemetry data
             telemetry = generate_telemetry_data()
             
-            # Convert to JSON string
-            payload_json = json.dumps(telemetry, separators=(',', ':'))
+            # Serialize to JSON bytes (paho accepts bytes as-is)
+            samples.append(encode_telemetry(telemetry))
             
-            # Publish to MQTT
-            result = client.publish(MQTT_TOPIC, payload_json, qos=MQTT_QOS)
-            
-            if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                message_count += 1
-                timestamp_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+            if len(samples) >= args.aggregate:
+                # Several samples go out as one JSON array to amortize per-message overhead
+                payload_bytes = samples[0] if args.aggregate == 1 else b"[" + b",".join(samples) + b"]"
+                samples.clear()
                 
-                print(f"📤 [{message_count}] {timestamp_str}")
-                print(f"   Topic: {MQTT_TOPIC}")
-                print(f"   QoS: {MQTT_QOS}")
-                print(f"   Payload: {payload_json}")
-                print(f"   Temp: {telemetry['bme']['t']}°C | Pressure: {telemetry['bme']['p']}hPa | Humidity: {telemetry['bme']['h']}%")
-                print(f"   Soil: {telemetry['soil']} | Water: {telemetry['water']} | Pumps: {telemetry['pump']}")
-                print()
-            else:
-                print(f"❌ Failed to publish message: {result.rc}")
+                # Publish to MQTT
+                result = publisher.publish(payload_bytes)
+                
+                if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                    message_count += 1
+                    
+                    if logger.isEnabledFor(logging.DEBUG):
+                        now = time.time()
+                        timestamp_str = "%s.%03d" % (time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)),
+                                                     int(now % 1 * 1000))
+                        bme = telemetry["bme"]
+                        logger.debug(
+                            "📤 [%d] %s\n"
+                            "   Topic: %s\n"
+                            "   QoS: %d\n"
+                            "   Payload: %s\n"
+                            "   Temp: %s°C | Pressure: %shPa | Humidity: %s%%\n"
+                            "   Soil: %s | Water: %s | Pumps: %s\n",
+                            message_count, timestamp_str, MQTT_TOPIC, MQTT_QOS,
+                            payload_bytes.decode(), bme["t"], bme["p"], bme["h"],
+                            telemetry["soil"], telemetry["water"], telemetry["pump"]
+                        )
+                    elif message_count % LOG_EVERY == 0:
+                        logger.info("📤 [%s] %d messages published", client_id, message_count)
+                else:
+                    logger.error("❌ [%s] Failed to publish message: %s", client_id, result.rc)
             
-            # Wait before next publish
-            time.sleep(PUBLISH_INTERVAL)
+            # Wait until the next tick (resync if we fell behind)
+            sleep_for = ticker.delay()
+            if stop_event is None:
+                time.sleep(sleep_for)
+            else:
+                stop_event.wait(sleep_for)
             
     except KeyboardInterrupt:
-        print()
-        print("=" * 60)
-        print(f"🛑 Stopped by user. Total messages sent: {message_count}")
-        print("=" * 60)
+        pass
     except Exception as e:
-        print(f"❌ Error: {e}")
+        logger.error("❌ [%s] Error: %s", client_id, e)
     finally:
+        # Publish any partially filled aggregate before disconnecting
+        if samples and client.is_connected():
+            result = publisher.publish(b"[" + b",".join(samples) + b"]")
+            if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                result.wait_for_publish(timeout=2)
+                message_count += 1
+        
         # Cleanup
         client.loop_stop()
         client.disconnect()
-        print("👋 Disconnected from MQTT broker")
+    return message_count
+
+# Per-process state for --workers
+_worker_args = None
+_worker_stop = None
+_worker_listener = None
+
+def init_worker(args, stop_event):
+    """Pool initializer: own logger, own RNG stream, leave Ctrl+C to the parent"""
+    global _worker_args, _worker_stop, _worker_listener
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_args = args
+    _worker_stop = stop_event
+    logger.handlers.clear()
+    _worker_listener = setup_logging(logger, args.verbose)
+    reseed()
+
+def run_worker(index):
+    """Pin this worker to one CPU (Linux) and publish until stopped"""
+    if hasattr(os, "sched_setaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cpus[index % len(cpus)]})
+    try:
+        return publish_telemetry(f"STM32_Simulator_{os.getpid()}", _worker_args, _worker_stop)
+    finally:
+        # Flush this worker's queued log lines before handing back the result
+        _worker_listener.stop()
+        _worker_listener.start()
+
+def main():
+    """Main function to simulate STM32 MQTT publishing"""
+    
+    args = parse_args()
+    
+    if args.workers > 1:
+        # Fork the publishers before this process starts its own log listener
+        stop_event = multiprocessing.Event()
+        pool = multiprocessing.Pool(args.workers, initializer=init_worker,
+                                    initargs=(args, stop_event))
+    
+    # All output goes through the queued logger so lines stay in order
+    listener = setup_logging(logger, args.verbose)
+    
+    logger.info("=" * 60)
+    logger.info("🌱 STM32 MQTT Simulator")
+    logger.info("=" * 60)
+    logger.info("Broker: %s:%s", MQTT_BROKER, MQTT_PORT)
+    logger.info("Topic: %s", MQTT_TOPIC)
+    logger.info("QoS: %s", MQTT_QOS)
+    logger.info("Mode: %s", MODE)
+    logger.info("Samples per message: %d", args.aggregate)
+    logger.info("Workers: %d", args.workers)
+    logger.info("=" * 60)
+    logger.info("")
+    
+    if args.workers > 1:
+        with pool:
+            results = pool.map_async(run_worker, range(args.workers))
+            try:
+                counts = results.get()
+            except KeyboardInterrupt:
+                stop_event.set()
+                counts = results.get()
+        message_count = sum(counts)
+    else:
+        message_count = publish_telemetry(f"STM32_Simulator_{random.randint(1000, 9999)}", args)
+    
+    logger.info("")
+    logger.info("=" * 60)
+    logger.info("🛑 Simulator stopped. Total messages sent: %d", message_count)
+    logger.info("=" * 60)
+    logger.info("👋 Disconnected from MQTT broker")
+    listener.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+STM32 MQTT Simulator (asyncio)
+Same telemetry as simulate_stm32_mqtt.py, published from a single asyncio
+event loop with gmqtt instead of paho's background network thread.
+Requires: pip install gmqtt paho-mqtt
+(paho-mqtt is pulled in through simulate_stm32_mqtt and mqtt_helpers)
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+
+from gmqtt import Client as MQTTClient
+from gmqtt.mqtt.constants import MQTTv311
+
+from mqtt_helpers import Ticker, positive_float, positive_int, setup_logging
+from simulate_stm32_mqtt import (
+    LOG_EVERY,
+    MQTT_BROKER,
+    MQTT_PORT,
+    MQTT_QOS,
+    MQTT_TOPIC,
+    PUBLISH_INTERVAL,
+    encode_telemetry,
+    generate_telemetry_data,
+)
+
+logger = logging.getLogger(__name__)
+
+def on_connect(client, flags, rc, properties):
+    """Callback when connected to MQTT broker"""
+    logger.info("✅ Connected to MQTT broker: %s", MQTT_BROKER)
+    logger.info("📡 Publishing to topic: %s", MQTT_TOPIC)
+    logger.info("-" * 60)
+
+def on_disconnect(client, packet, exc=None):
+    """Callback when disconnected from MQTT broker"""
+    if exc is not None:
+        logger.warning("⚠️  Unexpected disconnection: %s", exc)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="STM32 MQTT telemetry simulator (asyncio/gmqtt)")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="log every published message in full")
+    parser.add_argument("--interval", type=positive_float, default=PUBLISH_INTERVAL,
+                        help=f"seconds between ticks (default: {PUBLISH_INTERVAL})")
+    parser.add_argument("--batch", type=positive_int, default=1,
+                        help="messages published back-to-back on every tick (default: 1)")
+    return parser.parse_args()
+
+async def publish_telemetry(args, stats):
+    """Connect and publish until cancelled, counting messages in stats["sent"]"""
+    client = MQTTClient(f"STM32_Simulator_{random.randint(1000, 9999)}")
+    client.on_connect = on_connect
+    client.on_disconnect = on_disconnect
+
+    # asyncio enables TCP_NODELAY on its TCP transports, so small frames
+    # are flushed immediately without an on_socket_open hook
+    logger.info("🔌 Connecting to %s:%s...", MQTT_BROKER, MQTT_PORT)
+    await client.connect(MQTT_BROKER, MQTT_PORT, keepalive=60, version=MQTTv311)
+
+    ticker = Ticker(args.interval)
+    try:
+        while True:
+            # gmqtt.publish() only writes to the transport buffer, so a batch
+            # goes out without any thread handoff or per-message await
+            for _ in range(args.batch):
+                payload_bytes = encode_telemetry(generate_telemetry_data())
+                client.publish(MQTT_TOPIC, payload_bytes, qos=MQTT_QOS)
+                stats["sent"] += 1
+                logger.debug("📤 [%d] %s", stats["sent"], payload_bytes.decode())
+
+            if not logger.isEnabledFor(logging.DEBUG) and stats["sent"] % (LOG_EVERY * args.batch) == 0:
+                logger.info("📤 %d messages published", stats["sent"])
+
+            # Wait until the next tick (resync if we fell behind)
+            await asyncio.sleep(ticker.delay())
+    finally:
+        await client.disconnect()
+
+def main():
+    """Main function to simulate STM32 MQTT publishing"""
+
+    args = parse_args()
+    # All output goes through the queued logger so lines stay in order
+    listener = setup_logging(logger, args.verbose)
+
+    logger.info("=" * 60)
+    logger.info("🌱 STM32 MQTT Simulator (asyncio)")
+    logger.info("=" * 60)
+    logger.info("Broker: %s:%s", MQTT_BROKER, MQTT_PORT)
+    logger.info("Topic: %s", MQTT_TOPIC)
+    logger.info("QoS: %s", MQTT_QOS)
+    logger.info("Batch: %d message(s) every %s seconds", args.batch, args.interval)
+    logger.info("=" * 60)
+    logger.info("")
+
+    stats = {"sent": 0}
+    try:
+        asyncio.run(publish_telemetry(args, stats))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error("❌ Error: %s", e)
+
+    logger.info("")
+    logger.info("=" * 60)
+    logger.info("🛑 Simulator stopped. Total messages sent: %d", stats["sent"])
+    logger.info("=" * 60)
+    logger.info("👋 Disconnected from MQTT broker")
+    listener.stop()
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,13 @@ This script simulates the exact data format your STM32 will send
 """
 
 import paho.mqtt.client as mqtt
-import json
+import argparse
+import logging
 import time
-import random
-import ssl
-from datetime import datetime
+from math import sin
+from random import randint
+
+from mqtt_helpers import Publisher, Ticker, build_client, positive_float, positive_int, setup_logging
 
 # HiveMQ Cloud Configuration (matching your STM32 and Next.js)
 BROKER = "b2a051ac43c4410e86861ed01b937dec.s1.eu.hivemq.cloud"
@@ -18,47 +20,57 @@ USERNAME = "user1"
 PASSWORD = "P@ssw0rd"
 
 # Topic (matching your STM32 and Next.js)
-TOPIC_TELEMETRY = "devices/stm32-01/telemetry"
+TOPIC_TELEMETRY = "devices/stm32-01/telemetry"  # str on purpose: paho encodes/validates topics and rejects bytes
+
+# Simulation settings
+PUBLISH_INTERVAL = 10  # seconds, like STM32
+# QoS 0 (default) is fire-and-forget for load runs; QoS 1/2 wait for broker
+# acknowledgments in batches, which keeps throughput close to QoS 0 because
+# ack tracking stays off the per-message path
+MQTT_QOS = 0
+BATCH_SIZE = 6  # wait for broker acknowledgment once per this many messages (~1 min)
+PUBLISH_TIMEOUT = 10  # seconds to wait for a batch acknowledgment
+LOG_EVERY = 10  # without --verbose, log a progress line every N messages
 
-def on_connect(client, userdata, flags, rc):
+logger = logging.getLogger(__name__)
+
+def on_connect(client, userdata, flags, rc, properties):
     if rc == 0:
-        print("🌱 STM32 Simulator connected to HiveMQ Cloud!")
-        print(f"📡 Publishing to: {TOPIC_TELEMETRY}")
-        print("✅ Next.js should now receive simulated STM32 data")
+        logger.info("🌱 STM32 Simulator connected to HiveMQ Cloud!")
+        logger.info("📡 Publishing to: %s", TOPIC_TELEMETRY)
+        logger.info("✅ Next.js should now receive simulated STM32 data")
     else:
-        print(f"❌ Failed to connect, return code {rc}")
+        logger.error("❌ Failed to connect, return code %s", rc)
 
-def on_publish(client, userdata, mid):
-    print(f"✅ Message {mid} published successfully")
+def on_publish(client, userdata, mid, rc, properties):
+    logger.debug("✅ Message %d published successfully", mid)
 
-def on_disconnect(client, userdata, rc):
-    print("🔌 Disconnected from broker")
+def on_disconnect(client, userdata, flags, rc, properties):
+    logger.info("🔌 Disconnected from broker")
 
 def generate_stm32_data(counter):
     """Generate realistic agricultural sensor data"""
     # Simulate realistic agricultural conditions
-    base_time = time.time()
-    
     # Atmospheric pressure (700-1100 hPa, varies slowly)
-    pressure = 1013 + int(50 * math.sin(counter * 0.01)) + random.randint(-20, 20)
+    pressure = 1013 + int(50 * sin(counter * 0.01)) + randint(-20, 20)
     
     # Air temperature (15-40°C, daily cycle)
-    air_temp = 25 + int(10 * math.sin(counter * 0.1)) + random.randint(-3, 3)
+    air_temp = 25 + int(10 * sin(counter * 0.1)) + randint(-3, 3)
     
     # Air humidity (30-90%, inversely related to temperature)
-    air_humidity = max(30, min(90, 80 - (air_temp - 25) * 2 + random.randint(-10, 10)))
+    air_humidity = max(30, min(90, 80 - (air_temp - 25) * 2 + randint(-10, 10)))
     
     # Soil temperature (follows air temp but more stable)
-    soil_temp = air_temp - 2 + random.randint(-2, 2)
+    soil_temp = air_temp - 2 + randint(-2, 2)
     
     # Soil humidity (varies based on irrigation and time)
     if counter % 100 < 20:  # Simulate irrigation cycle
-        soil_humidity = 80 + random.randint(-5, 10)
+        soil_humidity = 80 + randint(-5, 10)
     else:
-        soil_humidity = max(20, 80 - (counter % 100) + random.randint(-5, 5))
+        soil_humidity = max(20, 80 - (counter % 100) + randint(-5, 5))
     
     # Water level (decreases over time, refills periodically)
-    water_level = max(5, 90 - (counter % 120) + random.randint(-5, 5))
+    water_level = max(5, 90 - (counter % 120) + randint(-5, 5))
     
     return {
         "pressure": pressure,
@@ -70,35 +82,57 @@ def generate_stm32_data(counter):
         "timestamp": str(counter)  # STM32 sends simple counter
     }
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="STM32 data simulator for Next.js integration")
+    parser.add_argument("--qos", type=int, choices=(0, 1, 2), default=MQTT_QOS,
+                        help=f"MQTT QoS level; 1/2 enable acknowledgment tracking (default: {MQTT_QOS})")
+    parser.add_argument("--interval", type=positive_float, default=PUBLISH_INTERVAL,
+                        help=f"seconds between messages (default: {PUBLISH_INTERVAL})")
+    parser.add_argument("--count", type=positive_int,
+                        help="stop after N messages (default: run until Ctrl+C)")
+    parser.add_argument("--batch", type=positive_int, default=BATCH_SIZE,
+                        help=f"QoS 1/2 only: messages to publish before waiting for broker acknowledgment (default: {BATCH_SIZE})")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="log every published message in full")
+    return parser.parse_args()
+
+def log_batch(count, acknowledged):
+    """Publisher on_batch callback: report one broker acknowledgment per batch"""
+    if acknowledged:
+        logger.info("   ✅ Batch of %d message(s) acknowledged by broker", count)
+    else:
+        logger.warning("   ⚠️  Batch of %d message(s) not acknowledged within %ds", count, PUBLISH_TIMEOUT)
+
 def main():
-    import math  # Import here to avoid issues
+    args = parse_args()
+    # All output goes through the queued logger so lines stay in order
+    listener = setup_logging(logger, args.verbose)
     
-    print("🚀 STM32 Data Simulator for Next.js Integration")
-    print("=" * 60)
-    print(f"🌐 Broker: {BROKER}:{PORT}")
-    print(f"🔑 Username: {USERNAME}")
-    print(f"📡 Topic: {TOPIC_TELEMETRY}")
-    print("=" * 60)
+    logger.info("🚀 STM32 Data Simulator for Next.js Integration")
+    logger.info("=" * 60)
+    logger.info("🌐 Broker: %s:%s", BROKER, PORT)
+    logger.info("🔑 Username: %s", USERNAME)
+    logger.info("📡 Topic: %s", TOPIC_TELEMETRY)
+    logger.info("📶 QoS: %d", args.qos)
+    logger.info("=" * 60)
     
-    # Create MQTT client
-    client = mqtt.Client(client_id=f"stm32-simulator-{random.randint(1000, 9999)}")
-    
-    # Set credentials
-    client.username_pw_set(USERNAME, PASSWORD)
-    
-    # Enable TLS
-    client.tls_set(ca_certs=None, certfile=None, keyfile=None, 
-                  cert_reqs=ssl.CERT_REQUIRED, tls_version=ssl.PROTOCOL_TLSv1_2, 
-                  ciphers=None)
+    # Create MQTT client (TLS with credentials)
+    client = build_client(f"stm32-simulator-{randint(1000, 9999)}", tls=True,
+                          username=USERNAME, password=PASSWORD)
     
     # Set callbacks
     client.on_connect = on_connect
-    client.on_publish = on_publish
     client.on_disconnect = on_disconnect
+    if args.qos > 0:
+        client.on_publish = on_publish
+    
+    # Acknowledgments for QoS 1/2 are awaited once per batch
+    publisher = Publisher(client, TOPIC_TELEMETRY, qos=args.qos, batch=args.batch,
+                          timeout=PUBLISH_TIMEOUT, on_batch=log_batch)
     
     try:
         # Connect to broker
-        print("🔗 Connecting to HiveMQ Cloud...")
+        logger.info("🔗 Connecting to HiveMQ Cloud...")
         client.connect(BROKER, PORT, 60)
         
         # Start the loop
@@ -108,48 +142,71 @@ def main():
         time.sleep(3)
         
         counter = 1
-        print("🔄 Starting data simulation...")
-        print("📱 Open your Next.js app to see real-time data!")
-        print("⏰ Publishing every 10 seconds (like STM32)")
-        print("🛑 Press Ctrl+C to stop")
-        print("-" * 60)
+        sent = 0  # successfully queued publishes only
+        logger.info("🔄 Starting data simulation...")
+        logger.info("📱 Open your Next.js app to see real-time data!")
+        logger.info("⏰ Publishing every %s seconds", args.interval)
+        logger.info("🛑 Press Ctrl+C to stop")
+        logger.info("-" * 60)
         
+        ticker = Ticker(args.interval)
         while True:
             # Generate sensor data
             sensor_data = generate_stm32_data(counter)
-            payload = json.dumps(sensor_data)
             
-            # Publish data
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            print(f"[{timestamp}] 📤 STM32 Data #{counter}:")
-            print(f"   🌡️  Air: {sensor_data['airTemp']}°C, {sensor_data['airHumidity']}%")
-            print(f"   🌱 Soil: {sensor_data['soilTemp']}°C, {sensor_data['soilHumidity']}%")
-            print(f"   💧 Water: {sensor_data['waterLevel']}%")
-            print(f"   🔘 Pressure: {sensor_data['pressure']} hPa")
-            
-            result = client.publish(TOPIC_TELEMETRY, payload, qos=1)
+            # Publish data (serialized by the shared publisher)
+            result = publisher.publish(sensor_data)
             
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
-                print(f"   ✅ Published to Next.js dashboard")
+                sent += 1
+                if logger.isEnabledFor(logging.DEBUG):
+                    timestamp = time.strftime("%H:%M:%S")
+                    logger.debug(
+                        "[%s] 📤 STM32 Data #%d:\n"
+                        "   🌡️  Air: %s°C, %s%%\n"
+                        "   🌱 Soil: %s°C, %s%%\n"
+                        "   💧 Water: %s%%\n"
+                        "   🔘 Pressure: %s hPa\n"
+                        "   ✅ Published to Next.js dashboard\n"
+                        "%s",
+                        timestamp, counter,
+                        sensor_data["airTemp"], sensor_data["airHumidity"],
+                        sensor_data["soilTemp"], sensor_data["soilHumidity"],
+                        sensor_data["waterLevel"], sensor_data["pressure"],
+                        "-" * 60
+                    )
+                elif sent % LOG_EVERY == 0:
+                    logger.info("📤 %d messages published", sent)
             else:
-                print(f"   ❌ Publish failed: {result.rc}")
+                logger.error("   ❌ Publish failed: %s", result.rc)
             
-            print("-" * 60)
+            # Stop after the last message instead of sleeping another interval
+            if counter == args.count:
+                break
             counter += 1
-            time.sleep(10)  # 10 second interval like STM32
+            
+            # Wait until the next tick (resync if we fell behind)
+            time.sleep(ticker.delay())
+    
+        logger.info("✅ Sent %d messages", sent)
     
     except KeyboardInterrupt:
-        print("\n🛑 Simulation stopped by user")
+        logger.info("\n🛑 Simulation stopped by user")
     except Exception as e:
-        print(f"❌ Error: {e}")
-        print("\nTroubleshooting:")
-        print("1. Check your internet connection")
-        print("2. Verify HiveMQ Cloud credentials")
-        print("3. Make sure your Next.js app is running")
+        logger.error("❌ Error: %s", e)
+        logger.error("\nTroubleshooting:")
+        logger.error("1. Check your internet connection")
+        logger.error("2. Verify HiveMQ Cloud credentials")
+        logger.error("3. Make sure your Next.js app is running")
     finally:
+        try:
+            publisher.flush()
+        except Exception as e:
+            logger.warning("⚠️  Could not confirm pending messages: %s", e)
         client.loop_stop()
         client.disconnect()
-        print("👋 STM32 Simulator disconnected")
+        logger.info("👋 STM32 Simulator disconnected")
+        listener.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,14 +4,29 @@ Test MQTT WebSocket Subscriber
 Subscribe to d02/telemetry via WebSocket to see if messages arrive
 """
 
-import paho.mqtt.client as mqtt
+import argparse
 import time
+from collections import deque
+
+from mqtt_helpers import build_client
+
+# orjson parses bytes directly and is much faster than stdlib json
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
 
 MQTT_BROKER = "test.mosquitto.org"
 MQTT_PORT = 8080
 MQTT_TOPIC = "d02/telemetry"
+STATS_WINDOW = 100  # messages kept for throughput statistics
+STATS_EVERY = 10  # print statistics every N messages
+
+# (arrival time, payload size) of the most recent messages
+recent = deque(maxlen=STATS_WINDOW)
+message_count = 0
 
-def on_connect(client, userdata, flags, rc):
+def on_connect(client, userdata, flags, rc, properties):
     """Callback when connected"""
     if rc == 0:
         print(f"✅ Connected to {MQTT_BROKER}:{MQTT_PORT} (WebSocket)")
@@ -24,16 +39,51 @@ def on_connect(client, userdata, flags, rc):
 
 def on_message(client, userdata, msg):
     """Callback when message received"""
-    print(f"📨 Message received!")
-    print(f"   Topic: {msg.topic}")
-    print(f"   Payload: {msg.payload.decode()}")
+    global message_count
+    message_count += 1
+    recent.append((time.monotonic(), len(msg.payload)))
+    
+    # Per-message output (and parsing) only when asked for; printing every
+    # message caps throughput at the console's speed
+    if userdata["verbose"]:
+        print_message(msg)
+    
+    if message_count % STATS_EVERY == 0:
+        print_stats()
+
+def print_message(msg):
+    """Print a one-line summary of a received message"""
+    try:
+        data = loads(msg.payload)
+        # Aggregated simulator messages are a JSON array of samples
+        samples = data if isinstance(data, list) else [data]
+        last = samples[-1] if samples else None
+        ts = last.get("ts") if isinstance(last, dict) else None
+        print(f"📨 [{message_count}] {msg.topic} ts={ts} samples={len(samples)} ({len(msg.payload)} bytes)")
+    except ValueError:
+        print(f"📨 [{message_count}] {msg.topic} non-JSON payload ({len(msg.payload)} bytes)")
+
+def print_stats():
+    """Print message rate and average payload size over the recent window"""
+    elapsed = recent[-1][0] - recent[0][0]
+    rate = (len(recent) - 1) / elapsed if elapsed > 0 else 0.0
+    avg_size = sum(size for _, size in recent) / len(recent)
+    print(f"📊 {rate:.1f} msg/s | avg payload {avg_size:.0f} bytes (last {len(recent)} messages)")
     print("-" * 60)
 
-def on_subscribe(client, userdata, mid, granted_qos):
+def on_subscribe(client, userdata, mid, reason_codes, properties):
     """Callback when subscribed"""
-    print(f"✅ Subscribed successfully (QoS: {granted_qos[0]})")
+    print(f"✅ Subscribed successfully (QoS: {reason_codes[0].value})")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="MQTT WebSocket test subscriber")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help=f"print every message, not just stats every {STATS_EVERY}")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    
     print("=" * 60)
     print("🔍 MQTT WebSocket Test Subscriber")
     print("=" * 60)
@@ -44,19 +94,13 @@ def main():
     
     try:
         # Create WebSocket client
-        client = mqtt.Client(
-            client_id=f"TestSub_{int(time.time())}",
-            transport="websockets",
-            callback_api_version=mqtt.CallbackAPIVersion.VERSION1
-        )
+        client = build_client(f"TestSub_{int(time.time())}", ws=True)
+        client.user_data_set({"verbose": args.verbose})
         
         client.on_connect = on_connect
         client.on_message = on_message
         client.on_subscribe = on_subscribe
         
-        # Set WebSocket path
-        client.ws_set_options(path="/mqtt")
-        
         # Connect
         print(f"🔌 Connecting to {MQTT_BROKER}:{MQTT_PORT}...")
         client.connect(MQTT_BROKER, MQTT_PORT, 60)
@@ -7,17 +7,19 @@ Simple format: Just sends "POMPA" or "SEDOT" as plain text
 import paho.mqtt.client as mqtt
 import time
 
+from mqtt_helpers import Publisher, build_client
+
 BROKER = 'test.mosquitto.org'
 PORT = 1883
 TOPIC = 'd02/cmd'
 
-def on_connect(client, userdata, flags, rc):
+def on_connect(client, userdata, flags, rc, properties):
     if rc == 0:
         print("✅ Connected to MQTT broker!")
     else:
         print(f"❌ Connection failed with code {rc}")
 
-def on_publish(client, userdata, mid):
+def on_publish(client, userdata, mid, rc, properties):
     print(f"✅ Message published (mid: {mid})")
 
 def main():
@@ -28,9 +30,10 @@ def main():
     print(f"Topic: {TOPIC}\n")
     
     # Create MQTT client
-    client = mqtt.Client(client_id=f"PumpTester_{int(time.time())}")
+    client = build_client(f"PumpTester_{int(time.time())}")
     client.on_connect = on_connect
     client.on_publish = on_publish
+    publisher = Publisher(client, TOPIC, qos=1, batch=None)  # acks via on_publish, never block
     
     try:
         print("🔌 Connecting to MQTT broker...")
@@ -56,7 +59,7 @@ def main():
             print(f"{'='*60}")
             
             # Publish simple text command
-            result = client.publish(TOPIC, cmd, qos=1)
+            result = publisher.publish(cmd)
             
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
                 print(f"✅ Published: {cmd}")
@@ -5,21 +5,37 @@ Sends different sensor conditions to test all shallot states
 """
 
 import paho.mqtt.client as mqtt
+import asyncio
+import itertools
+import threading
 import time
 import sys
 import os
+import re
 from pathlib import Path
 
+from mqtt_helpers import Publisher, build_client
+
+# [ \t] rather than \s so an empty value never runs on into the next line
+ENV_LINE = re.compile(r'^[ \t]*(\w+)[ \t]*=[ \t]*(.*?)[ \t]*$', re.M)
+
+def unquote(value):
+    """Strip one matching pair of surrounding quotes, like python-dotenv"""
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    return value
+
 # Load environment variables from .env.local if it exists
 def load_env():
     env_file = Path(__file__).parent / '.env.local'
-    if env_file.exists():
-        with open(env_file) as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith('#') and '=' in line:
-                    key, value = line.split('=', 1)
-                    os.environ[key] = value
+    if not env_file.exists():
+        return
+    try:
+        from dotenv import dotenv_values
+        values = dotenv_values(env_file)
+    except ImportError:
+        values = {key: unquote(value) for key, value in ENV_LINE.findall(env_file.read_text())}
+    os.environ.update({key: value for key, value in values.items() if value is not None})
 
 load_env()
 
@@ -28,6 +44,10 @@ BROKER = os.getenv('MQTT_BROKER', 'test.mosquitto.org')
 PORT = int(os.getenv('MQTT_PORT', '1883'))
 TOPIC = os.getenv('MQTT_TOPIC', 'd02/data')
 
+# Auto-cycle timing
+CYCLE_DELAY = 5  # seconds between conditions
+ACK_TIMEOUT = 10  # seconds to wait for a cycle's broker acknowledgments
+
 # Test scenarios
 test_cases = {
     "1": {
@@ -64,38 +84,102 @@ test_cases = {
     }
 }
 
-def on_connect(client, userdata, flags, rc):
+# Publish payloads are static, so encode them once instead of on every send
+for test in test_cases.values():
+    test["message"] = test["message"].encode("ascii")
+
+# (name, ready-to-publish bytes) for each auto-cycle step, resolved once
+CYCLE_STEPS = [(test_cases[key]["name"], test_cases[key]["message"])
+               for key in ["1", "2", "3", "4", "5", "6", "7"]]
+
+def on_connect(client, userdata, flags, rc, properties):
     """Callback for when the client receives a CONNACK response from the server."""
     if rc == 0:
         print("✅ Connected to MQTT broker!")
     else:
         print(f"❌ Connection failed with code {rc}")
 
-def send_message(client, message):
-    """Send MQTT message"""
+def send_message(publisher, message):
+    """Send MQTT message (queued for the loop_start network thread, no ack wait)
+
+    Returns the message id, or None if the message could not be queued.
+    """
     try:
-        result = client.publish(TOPIC, message, qos=1)
-        result.wait_for_publish()
-        print(f"📤 Sent: {message}")
-        return True
+        result = publisher.publish(message)
+        if result.rc != mqtt.MQTT_ERR_SUCCESS:
+            print(f"❌ Failed to send message: {mqtt.error_string(result.rc)}")
+            return None
+        print(f"📤 Sent: {message.decode()}")
+        return result.mid
     except Exception as e:
         print(f"❌ Failed to send message: {e}")
-        return False
+        return None
+
+class PublishTracker:
+    """Maps message ids to asyncio events set from paho's on_publish callback"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.lock = threading.Lock()
+        self.pending = {}
+        # Acks that arrived before track() registered their mid
+        self.early = set()
+
+    def track(self, mid):
+        event = asyncio.Event()
+        with self.lock:
+            if mid in self.early:
+                self.early.discard(mid)
+                event.set()
+            else:
+                self.pending[mid] = event
+        return event
+
+    def on_publish(self, client, userdata, mid, rc, properties):
+        # Runs on the paho network thread
+        with self.lock:
+            event = self.pending.pop(mid, None)
+            if event is None:
+                self.early.add(mid)
+        if event is not None:
+            self.loop.call_soon_threadsafe(event.set)
+
+async def wait_for_acks(events):
+    """Wait for all events together; return how many were acknowledged"""
+    try:
+        await asyncio.wait_for(asyncio.gather(*(e.wait() for e in events)), ACK_TIMEOUT)
+    except asyncio.TimeoutError:
+        pass
+    return sum(e.is_set() for e in events)
 
-def auto_cycle(client):
+async def run_auto_cycle(publisher):
+    tracker = PublishTracker(asyncio.get_running_loop())
+    publisher.client.on_publish = tracker.on_publish
+    events = []
+    
+    try:
+        for step, (name, message) in enumerate(itertools.cycle(CYCLE_STEPS), 1):
+            print(f"\n{name}")
+            mid = send_message(publisher, message)
+            if mid is not None:
+                events.append(tracker.track(mid))
+            await asyncio.sleep(CYCLE_DELAY)  # Wait between conditions
+            
+            if step % len(CYCLE_STEPS) == 0:
+                # Confirm the whole cycle at once instead of blocking on each send
+                acked = await wait_for_acks(events)
+                print(f"\n✅ Cycle complete: {acked}/{len(CYCLE_STEPS)} messages acknowledged")
+                events = []
+    finally:
+        publisher.client.on_publish = None
+
+def auto_cycle(publisher):
     """Automatically cycle through all conditions"""
     print("\n🔄 Starting auto-cycle through all conditions...")
     print("Press Ctrl+C to stop\n")
     
-    conditions = ["1", "2", "3", "4", "5", "6", "7"]
-    
     try:
-        while True:
-            for condition in conditions:
-                test = test_cases[condition]
-                print(f"\n{test['name']}")
-                send_message(client, test["message"])
-                time.sleep(5)  # Wait 5 seconds between conditions
+        asyncio.run(run_auto_cycle(publisher))
     except KeyboardInterrupt:
         print("\n\n⏹️  Auto-cycle stopped")
 
@@ -106,9 +190,10 @@ def main():
     print(f"Broker: {BROKER}")
     print(f"Topic: {TOPIC}\n")
     
-    # Create MQTT client (compatible with older paho-mqtt versions)
-    client = mqtt.Client(client_id=f"ShallotTester_{int(time.time())}")
+    # Create MQTT client
+    client = build_client(f"ShallotTester_{int(time.time())}")
     client.on_connect = on_connect
+    publisher = Publisher(client, TOPIC, qos=1, batch=None)  # acks via on_publish, never block
     
     try:
         print("🔌 Connecting to MQTT broker...")
@@ -144,10 +229,10 @@ def main():
                 test = test_cases[choice]
                 
                 if choice == 'a':
-                    auto_cycle(client)
+                    auto_cycle(publisher)
                 else:
                     print(f"\n{test['name']}")
-                    send_message(client, test["message"])
+                    send_message(publisher, test["message"])
                     print("✅ Message sent! Check your dashboard.")
             else:
                 print("❌ Invalid choice. Please try again.")